@@ -0,0 +1,157 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+TCP 端口探测的 C 实现（可选，供 network_tcp_port_scan.py 的 native 后端使用）
+
+整批探测：所有 socket 非阻塞 connect 后统一 poll，期间不持有 GIL，多个线程可真正并行
+仅支持 POSIX（Linux / macOS）
+
+编译（生成的 _scan.*.so 放在 scripts 目录下即可被自动导入）：
+    pip install cython
+    cythonize -i scripts/_scan.pyx
+"""
+from libc.stdint cimport uint8_t, uint16_t, uint32_t, int64_t
+from libc.stdlib cimport malloc, free
+from libc.string cimport memset
+from libc.errno cimport errno, EINPROGRESS, EINTR
+from posix.fcntl cimport fcntl, F_GETFL, F_SETFL, O_NONBLOCK
+from posix.unistd cimport close
+from posix.time cimport clock_gettime, timespec, CLOCK_MONOTONIC
+
+cdef extern from "<sys/socket.h>" nogil:
+    ctypedef unsigned int socklen_t
+    struct sockaddr:
+        pass
+    struct linger:
+        int l_onoff
+        int l_linger
+    int AF_INET, SOCK_STREAM, SOL_SOCKET, SO_ERROR, SO_LINGER
+    int socket(int domain, int type, int protocol)
+    int connect(int fd, const sockaddr *addr, socklen_t len)
+    int getsockopt(int fd, int level, int name, void *val, socklen_t *len)
+    int setsockopt(int fd, int level, int name, const void *val, socklen_t len)
+
+cdef extern from "<netinet/in.h>" nogil:
+    struct in_addr:
+        uint32_t s_addr
+    struct sockaddr_in:
+        int sin_family
+        uint16_t sin_port
+        in_addr sin_addr
+    uint16_t htons(uint16_t port)
+
+cdef extern from "<poll.h>" nogil:
+    ctypedef unsigned long nfds_t
+    struct pollfd:
+        int fd
+        short events
+        short revents
+    short POLLOUT
+    int poll(pollfd *fds, nfds_t nfds, int timeout)
+
+cdef int64_t _now_ms() noexcept nogil:
+    cdef timespec ts
+    clock_gettime(CLOCK_MONOTONIC, &ts)
+    return <int64_t>ts.tv_sec * 1000 + ts.tv_nsec // 1000000
+
+cdef int _start_connect(uint32_t ip, uint16_t port, int *fd_out) noexcept nogil:
+    """发起非阻塞 connect：返回 1 已连接，0 进行中（fd_out 为待 poll 的 fd），-1 失败"""
+    cdef sockaddr_in addr
+    cdef linger lg
+    cdef int fd = socket(AF_INET, SOCK_STREAM, 0)
+    fd_out[0] = -1
+    if fd < 0:
+        return -1
+    fcntl(fd, F_SETFL, fcntl(fd, F_GETFL, 0) | O_NONBLOCK)
+    # close 时发 RST，不进入 TIME_WAIT
+    lg.l_onoff = 1
+    lg.l_linger = 0
+    setsockopt(fd, SOL_SOCKET, SO_LINGER, &lg, sizeof(lg))
+
+    memset(&addr, 0, sizeof(addr))
+    addr.sin_family = AF_INET
+    addr.sin_port = htons(port)
+    addr.sin_addr.s_addr = ip
+    if connect(fd, <sockaddr *>&addr, sizeof(addr)) == 0:
+        close(fd)
+        return 1
+    if errno == EINPROGRESS:
+        fd_out[0] = fd
+        return 0
+    close(fd)
+    return -1
+
+cdef void _probe_batch(const uint32_t *ips, const uint16_t *ports, uint8_t *out,
+                       Py_ssize_t n, int timeout_ms, pollfd *fds) noexcept nogil:
+    cdef Py_ssize_t i
+    cdef Py_ssize_t pending = 0
+    cdef int fd, err, ready, wait_ms
+    cdef socklen_t err_len
+    cdef int64_t deadline = _now_ms() + timeout_ms
+
+    for i in range(n):
+        out[i] = 0
+        fds[i].events = POLLOUT
+        fds[i].revents = 0
+        if _start_connect(ips[i], ports[i], &fd) == 1:
+            out[i] = 1
+        fds[i].fd = fd  # 负数 fd 会被 poll 忽略
+        if fd >= 0:
+            pending += 1
+
+    while pending > 0:
+        wait_ms = <int>(deadline - _now_ms())
+        if wait_ms <= 0:
+            break
+        ready = poll(fds, <nfds_t>n, wait_ms)
+        if ready < 0:
+            if errno == EINTR:
+                continue
+            break
+        if ready == 0:
+            break
+        for i in range(n):
+            if fds[i].fd < 0 or fds[i].revents == 0:
+                continue
+            err = 1
+            err_len = sizeof(err)
+            getsockopt(fds[i].fd, SOL_SOCKET, SO_ERROR, &err, &err_len)
+            out[i] = 1 if err == 0 else 0
+            close(fds[i].fd)
+            fds[i].fd = -1
+            pending -= 1
+
+    # 超时未完成的视为未开放
+    for i in range(n):
+        if fds[i].fd >= 0:
+            close(fds[i].fd)
+            fds[i].fd = -1
+
+def probe(uint32_t ip, uint16_t port, int timeout_ms):
+    """
+    探测单个端口，返回 True/False
+    ip 为网络字节序的 IPv4 地址（struct.unpack("=I", socket.inet_aton(host))[0]）
+    """
+    cdef uint8_t result = 0
+    cdef pollfd fd
+    with nogil:
+        _probe_batch(&ip, &port, &result, 1, timeout_ms, &fd)
+    return result == 1
+
+def probe_batch(const uint32_t[::1] ips, const uint16_t[::1] ports, uint8_t[::1] out, int timeout_ms):
+    """
+    整批探测：ips（array('I')，网络字节序）与 ports（array('H')）一一对应，
+    结果写入 out（bytearray），1 为开放；批量大小受进程文件描述符上限约束
+    """
+    cdef Py_ssize_t n = ips.shape[0]
+    if ports.shape[0] != n or out.shape[0] != n:
+        raise ValueError("ips、ports、out 长度必须一致")
+    if n == 0:
+        return
+    cdef pollfd *fds = <pollfd *>malloc(n * sizeof(pollfd))
+    if fds == NULL:
+        raise MemoryError()
+    try:
+        with nogil:
+            _probe_batch(&ips[0], &ports[0], &out[0], n, timeout_ms, fds)
+    finally:
+        free(fds)
@@ -6,25 +6,39 @@ ffmpeg
 import os
 import subprocess
 import argparse
+import concurrent.futures
+from itertools import repeat
+from typing import Optional
+
+# 转换时的 ffmpeg 公共参数：-nostdin 不读取终端（多个 ffmpeg 并行时不会争抢按键、把终端留在 raw 模式），
+# 只输出错误和一行进度，并行时输出不会混成一团
+FFMPEG = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-stats"]
 
 def get_non_conflicting_path(dst: str) -> str:
     """
     如果目标文件已存在，则自动在文件名后加序号，避免覆盖
+    用 O_CREAT | O_EXCL 原子地创建一个空的占位文件，多个进程同时转换也不会选中同一个文件名
     """
     base, ext = os.path.splitext(dst)
     counter = 1
     new_dst = dst
-    while os.path.exists(new_dst):
-        new_dst = f"{base}_{counter}{ext}"
-        counter += 1
-    return new_dst
+    while True:
+        try:
+            fd = os.open(new_dst, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            new_dst = f"{base}_{counter}{ext}"
+            counter += 1
+            continue
+        os.close(fd)
+        return new_dst
 
-def convert_audio(src: str, output_ext: str="mp3", codec: str="aac"):
+def convert_audio(src: str, output_ext: str="mp3", codec: str="aac", threads: Optional[int]=None):
     """使用 ffmpeg 转换音频格式
     
     :param src: 源文件路径
     :param output_ext: 输出格式扩展名（不带点，如 "mp3"、"wav"）
     :param codec: 音频编码方式 ("aac", "mp3", "copy" 等)
+    :param threads: ffmpeg 线程数，多个文件并行转换时用来避免线程数超过 CPU 核数
     """
     if not os.path.isfile(src):
         raise FileNotFoundError(f"文件不存在: {src}")
@@ -32,7 +46,9 @@ def convert_audio(src: str, output_ext: str="mp3", codec: str="aac"):
     dst = os.path.splitext(src)[0] + f".{output_ext}"
     dst = get_non_conflicting_path(dst)
 
-    command = ["ffmpeg", "-i", src]
+    command = [*FFMPEG, "-i", src]
+    if threads:
+        command += ["-threads", str(threads)]
 
     if codec == "copy":
         command += ["-c:a", "copy"]  # 不转码，直接封装
@@ -42,7 +58,15 @@ def convert_audio(src: str, output_ext: str="mp3", codec: str="aac"):
     command += [dst, "-y"]
 
     print(f"正在转换: {src} -> {dst}")
-    subprocess.run(command, check=True)
+    try:
+        subprocess.run(command, check=True)
+    except BaseException:
+        # 转换失败或被中断时删除占位文件
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        raise
     print("转换完成 ✅")
 
 if __name__ == "__main__":
@@ -51,15 +75,22 @@ if __name__ == "__main__":
     parser.add_argument("--input-ext", default="wav", help="输入文件扩展名（默认 wav）")
     parser.add_argument("--output-ext", default="mp3", help="输出文件扩展名（默认 mp3）")
     parser.add_argument("--codec", default="aac", help="音频编码方式（默认 aac，可用 copy 保持原始编码）")
+    parser.add_argument("--jobs", "-j", type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                        help="目录模式下同时运行的 ffmpeg 进程数（默认 CPU 核数的一半）")
     args = parser.parse_args()
 
     input_ext = args.input_ext.lower().lstrip(".")
     output_ext = args.output_ext.lower().lstrip(".")
 
     if os.path.isdir(args.src):
-        for file in os.listdir(args.src):
-            if file.lower().endswith(f".{input_ext}"):
-                audio_path = os.path.join(args.src, file)
-                convert_audio(audio_path, output_ext, args.codec)
+        # scandir 的 DirEntry 自带文件类型，无需额外 stat
+        with os.scandir(args.src) as entries:
+            paths = [entry.path for entry in entries
+                     if entry.is_file() and entry.name.lower().endswith(f".{input_ext}")]
+        jobs = max(1, min(args.jobs, len(paths)))
+        # 多进程并行转换，每个 ffmpeg 分到的线程数 = CPU 核数 / 进程数
+        threads = max(1, (os.cpu_count() or 1) // jobs) if jobs > 1 else None
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            list(executor.map(convert_audio, paths, repeat(output_ext), repeat(args.codec), repeat(threads)))
     else:
         convert_audio(args.src, output_ext, args.codec)
@@ -5,26 +5,93 @@
 - 支持通过 CIDR（如 192.168.1.0/24）或从文件读取主机列表扫描
 - 支持单端口 / 多端口 / 端口范围（例如: 22,80,8000-8010）
 - 支持超时、并发数等参数
-- 支持输出到 CSV 或 JSON 文件
-- 可选先 ping 主机以减少不必要端口探测（可能需要管理员权限）
+- 默认使用非阻塞 connect + selectors（Linux 下为 epoll）单线程多路复用，也可切换回线程池
+- 也可选 asyncio 后端：单线程事件循环 + Semaphore 限制并发
+- 编译可选的 C 扩展 _scan.pyx（cythonize -i scripts/_scan.pyx）后可用 native 后端：整批 connect + poll 时释放 GIL
+- Linux 下安装 liburing（pip install liburing，内核 >= 5.11）后自动改用 io_uring 批量提交 connect
+- 支持输出到 CSV / JSON / JSON Lines 文件，扫描过程中边发现边写入（中途中断也能保留已发现的结果）
+- 可选先 ping 主机以减少不必要端口探测：优先一次 fping 批量探测，其次单个 ICMP socket 批量收发
+  （原始 socket 需要管理员权限），最后才逐台调用系统 ping
+
+大规模扫描时的本地端口：
+- 探测 socket 设置 SO_LINGER(1, 0)，关闭时直接发 RST，不进入 TIME_WAIT，本地端口立即可复用
+- 可用 --bind-range 20000-60000 让源端口在指定范围内轮转
+- Linux 下还可以调大临时端口范围并允许复用 TIME_WAIT：
+    sysctl -w net.ipv4.ip_local_port_range="10000 65000"
+    sysctl -w net.ipv4.tcp_tw_reuse=1
 """
 
 import argparse
+import asyncio
 import socket
+import selectors
+import errno
+import time
+import collections
+import gc
 import ipaddress
 import concurrent.futures
 import csv
 import json
+import struct
+import itertools
+import select
+from array import array
 import sys
-from typing import List, Tuple, Iterable
+from typing import Callable, Dict, List, Set, Tuple, Iterable, Iterator, Optional
 import subprocess
 import platform
 import os
 
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+try:
+    import liburing
+except ImportError:  # 可选依赖，仅 Linux
+    liburing = None
+
+try:
+    import _scan  # 可选的 C 扩展，见 _scan.pyx
+except ImportError:
+    _scan = None
+
+# 非阻塞 connect 返回这些错误码表示连接仍在进行中
+_CONNECT_IN_PROGRESS = {errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN}
+if hasattr(errno, "WSAEWOULDBLOCK"):
+    _CONNECT_IN_PROGRESS.add(errno.WSAEWOULDBLOCK)
+
+# struct linger：l_onoff=1, l_linger=0，close 时发送 RST（Windows 上两个字段为 u_short）
+_LINGER_RST = struct.pack("HH" if sys.platform == "win32" else "ii", 1, 0)
+
+# 每个字节值中被置位的 bit 下标，用于从端口位图还原端口号
+_BYTE_BITS = [tuple(bit for bit in range(8) if value & (1 << bit)) for value in range(256)]
+
+# 主机名 -> IPv4 地址（解析失败为 None），每个主机名只解析一次
+_resolve_cache: Dict[str, Optional[str]] = {}
+
+# 扫描期间关闭自动 GC，每完成这么多个任务手动回收一次年轻代
+_GC_INTERVAL = 10000
+
+_HAS_QUICKACK = hasattr(socket, "TCP_QUICKACK")
+
+# --bind-range 指定时轮转使用的源端口
+_src_port: Optional[Iterator[int]] = None
+
+# native 后端每次交给 C 扩展探测的任务数
+_NATIVE_CHUNK = 256
+
+# io_uring 中 link timeout 的 user_data 以最高位标记，与 connect 区分
+_URING_TIMEOUT_TAG = 1 << 63
+_URING_ENTRIES = 4096
+
 def parse_ports(ports_str: str) -> List[int]:
     """解析端口字符串，支持 '22', '22,80', '8000-8010' 的组合"""
     parts = [p.strip() for p in ports_str.split(",") if p.strip()]
-    ports = set()
+    # 65536 位的位图，每个端口占 1 bit，避免大范围时生成大量 int 对象
+    bitmap = bytearray(8192)
     for p in parts:
         if "-" in p:
             lo, hi = p.split("-", 1)
@@ -32,10 +99,35 @@ def parse_ports(ports_str: str) -> List[int]:
             hi_i = int(hi)
             if lo_i > hi_i:
                 lo_i, hi_i = hi_i, lo_i
-            ports.update(range(lo_i, hi_i + 1))
         else:
-            ports.add(int(p))
-    return sorted(p for p in ports if 0 < p <= 65535)
+            lo_i = hi_i = int(p)
+        # 只保留合法端口 1-65535
+        lo_i = max(lo_i, 1)
+        hi_i = min(hi_i, 65535)
+        if lo_i > hi_i:
+            continue
+        # 首尾不足一个字节的部分逐位设置，中间整字节直接填 0xff
+        first_full = (lo_i + 7) >> 3
+        last_full = (hi_i + 1) >> 3
+        if first_full >= last_full:
+            for i in range(lo_i, hi_i + 1):
+                bitmap[i >> 3] |= 1 << (i & 7)
+            continue
+        for i in range(lo_i, first_full << 3):
+            bitmap[i >> 3] |= 1 << (i & 7)
+        bitmap[first_full:last_full] = b"\xff" * (last_full - first_full)
+        for i in range(last_full << 3, hi_i + 1):
+            bitmap[i >> 3] |= 1 << (i & 7)
+    ports = []
+    for byte_i, byte in enumerate(bitmap):
+        if not byte:
+            continue
+        base = byte_i << 3
+        if byte == 0xff:
+            ports.extend(range(base, base + 8))
+        else:
+            ports.extend([base + bit for bit in _BYTE_BITS[byte]])
+    return ports
 
 def load_hosts_from_file(path: str) -> List[str]:
     """从文件读取每行一个 IP/host（忽略空行和注释）"""
@@ -48,18 +140,40 @@ def load_hosts_from_file(path: str) -> List[str]:
             hosts.append(line)
     return hosts
 
-def expand_network(network_cidr: str) -> List[str]:
-    """将 CIDR 展开为主机 IP 列表（排除网络地址和广播）"""
+class HostRange:
+    """
+    一段连续的主机 IP：迭代时按需逐个生成，不预先展开成列表，同时支持 len() 得到主机数
+    其中的 IP 不会重复，扫描时无需去重
+    """
+    def __init__(self, start: int, end: int, version: int = 4):
+        self._ints = range(start, end + 1)
+        self._cls = ipaddress.IPv4Address if version == 4 else ipaddress.IPv6Address
+
+    def __len__(self) -> int:
+        return len(self._ints)
+
+    def __iter__(self) -> Iterator[str]:
+        return (str(self._cls(i)) for i in self._ints)
+
+def expand_network(network_cidr: str) -> HostRange:
+    """将 CIDR 展开为主机 IP（与 ip_network.hosts() 一致：排除网络地址和 IPv4 广播），按需逐个生成"""
     net = ipaddress.ip_network(network_cidr, strict=False)
-    return [str(ip) for ip in net.hosts()]
+    start = int(net.network_address)
+    end = int(net.broadcast_address)
+    # /31、/32（IPv6 为 /127、/128）没有单独的网络地址和广播地址
+    if net.num_addresses > 2:
+        start += 1
+        if net.version == 4:
+            end -= 1
+    return HostRange(start, end, net.version)
 
-def expand_ip_range(start_ip: str, end_ip: str) -> List[str]:
-    """根据开始和结束 IP（包含两端）生成主机列表"""
+def expand_ip_range(start_ip: str, end_ip: str) -> HostRange:
+    """根据开始和结束 IP（包含两端）逐个生成主机 IP"""
     start = int(ipaddress.IPv4Address(start_ip))
     end = int(ipaddress.IPv4Address(end_ip))
     if start > end:
         start, end = end, start
-    return [str(ipaddress.IPv4Address(i)) for i in range(start, end + 1)]
+    return HostRange(start, end)
 
 def is_host_alive_ping(host: str, timeout: float = 1.0) -> bool:
     """使用系统 ping 判断主机是否在线（跨平台）"""
@@ -77,89 +191,660 @@ def is_host_alive_ping(host: str, timeout: float = 1.0) -> bool:
     except Exception:
         return False
 
-def check_tcp_port(host: str, port: int, timeout: float = 0.5) -> bool:
-    """检查 TCP 端口是否开放，返回 True/False"""
+def resolve_host(host: str) -> Optional[str]:
+    """将主机名解析为 IPv4 地址（结果缓存），本身就是 IP 时直接返回，失败返回 None"""
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-            sock.settimeout(timeout)
-            result = sock.connect_ex((host, port))
-            return result == 0
-    except Exception:
-        return False
+        socket.inet_pton(socket.AF_INET, host)
+        return host
+    except (OSError, ValueError):
+        pass
+    if host not in _resolve_cache:
+        try:
+            _resolve_cache[host] = socket.getaddrinfo(host, None, socket.AF_INET, socket.SOCK_STREAM)[0][4][0]
+        except (OSError, UnicodeError):
+            _resolve_cache[host] = None
+    return _resolve_cache[host]
+
+def set_bind_range(lo: int, hi: int):
+    """设置探测 socket 轮转绑定的源端口范围（包含两端，需在 1-65535 内）"""
+    global _src_port
+    if lo > hi:
+        lo, hi = hi, lo
+    if lo < 1 or hi > 65535:
+        raise ValueError(f"源端口需在 1-65535 之间: {lo}-{hi}")
+    _src_port = itertools.cycle(range(lo, hi + 1))
+
+def _new_probe_socket() -> socket.socket:
+    """创建探测用 TCP socket：close 时发 RST 跳过 TIME_WAIT，可选绑定轮转源端口"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RST)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if _HAS_QUICKACK:
+            # Linux：立即回 ACK，不等待延迟确认
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        if _src_port is not None:
+            # 允许复用刚释放的源端口
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            # 端口被占用时换下一个，最多尝试 16 次
+            for attempt in range(16):
+                try:
+                    sock.bind(("", next(_src_port)))
+                    break
+                except OSError as e:
+                    if e.errno != errno.EADDRINUSE or attempt == 15:
+                        raise
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+def _fping_sweep(hosts: List[str], timeout: float) -> Optional[Set[str]]:
+    """用一次 fping 探测所有主机，返回存活主机集合；未安装 fping 或执行出错时返回 None"""
+    cmd = ["fping", "-a", "-q", "-r", "0", "-t", str(int(timeout * 1000))]
+    try:
+        proc = subprocess.run(cmd, input="\n".join(hosts), capture_output=True, text=True)
+    except OSError:
+        return None
+    # 退出码 0：全部存活，1：部分不可达，2：有主机无法解析；更大的为参数或系统错误
+    if proc.returncode > 2:
+        return None
+    return set(proc.stdout.split())
 
-def scan_targets(hosts: Iterable[str], ports: Iterable[int], timeout: float, workers: int,
-                 ping_first: bool = False) -> List[Tuple[str, int]]:
+def _icmp_checksum(data: bytes) -> int:
+    """计算 ICMP 校验和"""
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+def _icmp_sweep(hosts: List[str], timeout: float) -> Optional[Set[str]]:
     """
-    并发扫描
-    返回开放的 (host, port) 列表
+    用单个 ICMP socket 向所有主机发送 echo 请求并统一收取回复，返回存活主机集合
+    原始 socket 需要管理员权限；Linux 下无权限时尝试非特权 ICMP（net.ipv4.ping_group_range），都不可用时返回 None
     """
-    tasks = []
-    open_list = []
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        raw = True
+    except OSError:
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            raw = False
+        except OSError:
+            return None
 
-    # 如果启用 ping_first，先筛选存活主机
-    if ping_first:
-        alive_hosts = []
-        print("正在 ping 主机以筛选存活目标...")
-        with concurrent.futures.ThreadPoolExecutor(max_workers=min(200, workers)) as pool:
-            fut_to_host = {pool.submit(is_host_alive_ping, h, max(1, int(timeout))): h for h in hosts}
+    ident = os.getpid() & 0xffff
+    targets = set(hosts)
+    alive = set()
+
+    def drain(wait: float) -> bool:
+        """收取所有已到达的回复；wait 秒内没有回复时返回 False"""
+        readable, _, _ = select.select([sock], [], [], wait)
+        if not readable:
+            return False
+        while True:
+            try:
+                data, addr = sock.recvfrom(2048)
+            except BlockingIOError:
+                return True
+            # 原始 socket 收到的数据带 IP 头
+            icmp = data[(data[0] & 0x0f) * 4:] if raw else data
+            if len(icmp) < 8:
+                continue
+            icmp_type, _, _, reply_ident, _ = struct.unpack("!BBHHH", icmp[:8])
+            # 非特权 ICMP 的 id 由内核改写，只能按来源地址匹配
+            if icmp_type == 0 and (not raw or reply_ident == ident) and addr[0] in targets:
+                alive.add(addr[0])
+
+    with sock:
+        sock.setblocking(False)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        except OSError:
+            pass
+        for seq, host in enumerate(hosts):
+            header = struct.pack("!BBHHH", 8, 0, 0, ident, seq & 0xffff)
+            payload = b"python_tools"
+            checksum = _icmp_checksum(header + payload)
+            packet = struct.pack("!BBHHH", 8, 0, checksum, ident, seq & 0xffff) + payload
+            try:
+                sock.sendto(packet, (host, 0))
+            except OSError:
+                pass
+            # 边发边收：接收缓冲区受 net.core.rmem_max 限制，只能存几百个回复，
+            # 大网段全部发完再收会丢掉发送期间到达的回复
+            drain(0)
+
+        deadline = time.monotonic() + timeout
+        while len(alive) < len(targets):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not drain(remaining):
+                break
+    return alive
+
+def bulk_ping(hosts: List[str], timeout: float = 1.0, workers: int = 200) -> List[str]:
+    """
+    批量判断主机是否在线，返回存活主机（保持原顺序）
+    依次尝试：fping 一次探测全部主机 -> 单个 ICMP socket 批量收发 -> 逐台调用系统 ping
+    """
+    alive = _fping_sweep(hosts, timeout)
+    if alive is None:
+        alive = _icmp_sweep(hosts, timeout)
+    if alive is None:
+        alive = set()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(workers, len(hosts)))) as pool:
+            fut_to_host = {pool.submit(is_host_alive_ping, h, timeout): h for h in hosts}
             for fut in concurrent.futures.as_completed(fut_to_host):
-                h = fut_to_host[fut]
                 try:
                     if fut.result():
-                        alive_hosts.append(h)
-                    else:
-                        # 可选：打印不可达
-                        pass
+                        alive.add(fut_to_host[fut])
                 except Exception:
                     pass
-        hosts = alive_hosts
-        print(f"存活主机数: {len(hosts)}")
+    return [h for h in hosts if h in alive]
+
+def check_tcp_port(host: str, port: int, timeout: float = 0.5) -> bool:
+    """检查 TCP 端口是否开放，返回 True/False（host 应为已解析的 IP，避免每次 connect 都查 DNS）"""
+    # 热路径：不用 with，直接在 finally 中关闭
+    try:
+        sock = _new_probe_socket()
+    except OSError:
+        return False
+    try:
+        sock.settimeout(timeout)
+        return sock.connect_ex((host, port)) == 0
+    except Exception:
+        return False
+    finally:
+        sock.close()
+
+def _max_inflight(requested: int) -> int:
+    """根据进程文件描述符上限修正同时在途的连接数"""
+    if resource is not None:
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY:
+            # 预留一部分 fd 给标准输入输出、输出文件等
+            return max(1, min(requested, soft - 64))
+    elif sys.platform == "win32":
+        # Windows 下 select() 最多支持 512 个 socket
+        return max(1, min(requested, 500))
+    return max(1, requested)
+
+def scan_targets_epoll(tasks: Iterable[Tuple[str, int]], timeout: float,
+                       batch_size: int = 1024) -> Iterator[Tuple[str, int, bool]]:
+    """
+    单线程事件驱动扫描：非阻塞 connect + selectors（Linux 为 epoll）
+    同时最多 batch_size 个连接在途，逐个产出 (host, port, 是否开放)
+    """
+    batch_size = _max_inflight(batch_size)
+    sel = selectors.DefaultSelector()
+    # 超时时间固定，按注册顺序即为截止时间顺序，用队列即可
+    deadlines = collections.deque()
+    task_iter = iter(tasks)
+    exhausted = False
+    try:
+        while True:
+            # 补充在途连接
+            while not exhausted and len(sel.get_map()) < batch_size:
+                task = next(task_iter, None)
+                if task is None:
+                    exhausted = True
+                    break
+                host, port = task
+                try:
+                    sock = _new_probe_socket()
+                except OSError:
+                    yield host, port, False
+                    continue
+                sock.setblocking(False)
+                try:
+                    err = sock.connect_ex((host, port))
+                except OSError:
+                    sock.close()
+                    yield host, port, False
+                    continue
+                if err in _CONNECT_IN_PROGRESS:
+                    sel.register(sock, selectors.EVENT_WRITE, (host, port))
+                    deadlines.append((time.monotonic() + timeout, sock))
+                else:
+                    sock.close()
+                    yield host, port, err in (0, errno.EISCONN)
+
+            if not sel.get_map():
+                break
+
+            # 一次 select 批量等待所有在途连接
+            wait = max(0.0, deadlines[0][0] - time.monotonic()) if deadlines else timeout
+            for key, _ in sel.select(wait):
+                sock = key.fileobj
+                host, port = key.data
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                sel.unregister(sock)
+                sock.close()
+                yield host, port, err == 0
+
+            # 清理已超时的连接（已关闭的 socket fileno 为 -1，直接跳过）
+            now = time.monotonic()
+            while deadlines and (deadlines[0][0] <= now or deadlines[0][1].fileno() == -1):
+                _, sock = deadlines.popleft()
+                if sock.fileno() == -1:
+                    continue
+                host, port = sel.unregister(sock).data
+                sock.close()
+                yield host, port, False
+    finally:
+        for key in list(sel.get_map().values()):
+            key.fileobj.close()
+        sel.close()
+
+def open_uring(entries: int = _URING_ENTRIES):
+    """创建 io_uring 实例，内核不支持时抛出 OSError"""
+    if liburing is None or not sys.platform.startswith("linux"):
+        raise OSError("io_uring 不可用（需要 Linux 并安装 liburing）")
+    ring = liburing.Ring()
+    try:
+        # 只有本线程提交，且仅在等待时处理完成事件
+        liburing.io_uring_queue_init(entries, ring, liburing.IORING_SETUP_SINGLE_ISSUER
+                                     | liburing.IORING_SETUP_DEFER_TASKRUN)
+    except OSError:
+        # 内核 < 6.1 不支持上面的 flags
+        ring = liburing.Ring()
+        liburing.io_uring_queue_init(entries, ring)
+    return ring
 
-    # 生成 (host,port) 任务
+def scan_targets_uring(ring, tasks: Iterable[Tuple[str, int]], timeout: float,
+                       batch_size: int = 1024) -> Iterator[Tuple[str, int, bool]]:
+    """
+    io_uring 扫描：每个 connect 挂一个 link timeout，成批提交、成批收割完成事件
+    res == 0 为开放，-ECONNREFUSED 为关闭，-ECANCELED（超时）视为过滤
+    扫描结束后释放 ring
+    """
+    batch_size = min(_max_inflight(batch_size), _URING_ENTRIES // 2)
+    ts = liburing.timespec(timeout)
+    cqe = liburing.Cqe()
+    # task_id -> (sock, addr, host, port)；addr 需保持存活直到内核完成 connect
+    inflight = {}
+    next_id = 0
+    task_iter = iter(tasks)
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(inflight) < batch_size:
+                task = next(task_iter, None)
+                if task is None:
+                    exhausted = True
+                    break
+                host, port = task
+                try:
+                    addr = liburing.Sockaddr(liburing.AF_INET, host, port)
+                    sock = _new_probe_socket()
+                except (OSError, ValueError):
+                    yield host, port, False
+                    continue
+                sock.setblocking(False)
+
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_connect(sqe, sock.fileno(), addr)
+                sqe.flags |= liburing.IOSQE_IO_LINK
+                sqe.user_data = next_id
+                sqe = liburing.io_uring_get_sqe(ring)
+                liburing.io_uring_prep_link_timeout(sqe, ts, 0)
+                sqe.user_data = next_id | _URING_TIMEOUT_TAG
+
+                inflight[next_id] = (sock, addr, host, port)
+                next_id += 1
+
+            if not inflight:
+                break
+
+            liburing.io_uring_submit(ring)
+            liburing.io_uring_wait_cqe(ring, cqe)
+            # CqeIter 会处理环形队列回绕，每次只更新 cqe[0]
+            seen = 0
+            finished = []
+            for _ in liburing.CqeIter(ring, cqe):
+                seen += 1
+                entry = cqe[0]
+                task_id = entry.user_data
+                if task_id & _URING_TIMEOUT_TAG:
+                    continue
+                try:
+                    res = entry.res
+                except OSError as e:
+                    # 绑定层把负的 res 转成了异常
+                    res = -(e.errno or 1)
+                finished.append((task_id, res))
+            liburing.io_uring_cq_advance(ring, seen)
+
+            for task_id, res in finished:
+                sock, _, host, port = inflight.pop(task_id)
+                sock.close()
+                yield host, port, res == 0
+    finally:
+        # 先退出 ring（会取消未完成的请求），再关闭 socket
+        liburing.io_uring_queue_exit(ring)
+        for sock, _, _, _ in inflight.values():
+            sock.close()
+
+async def _probe(host: str, port: int, timeout: float, sem: asyncio.Semaphore,
+                 results: asyncio.Queue):
+    """
+    asyncio 探测单个端口，结果 (host, port, 是否开放) 放入 results 队列
+    任何异常都视为未开放并照常放入结果，否则 _next_results 会一直等待
+    """
+    async with sem:
+        loop = asyncio.get_running_loop()
+        is_open = False
+        try:
+            sock = _new_probe_socket()
+            try:
+                sock.setblocking(False)
+                await asyncio.wait_for(loop.sock_connect(sock, (host, port)), timeout)
+                is_open = True
+            finally:
+                sock.close()
+        except Exception:
+            # 连接失败、超时，或创建 socket 出错（如绑定的源端口无效）
+            pass
+        finally:
+            results.put_nowait((host, port, is_open))
+
+async def _next_results(results: asyncio.Queue) -> List[Tuple[str, int, bool]]:
+    """等待至少一个结果，并取走当前已就绪的全部结果"""
+    items = [await results.get()]
+    while not results.empty():
+        items.append(results.get_nowait())
+    return items
+
+def scan_targets_asyncio(tasks: Iterable[Tuple[str, int]], timeout: float,
+                         workers: int = 1024) -> Iterator[Tuple[str, int, bool]]:
+    """asyncio 扫描：单线程事件循环驱动，Semaphore 限制同时在途的连接数"""
+    workers = _max_inflight(workers)
+    # 已创建但未完成的探测任务最多为并发数的 4 倍，任务按需创建而不是一次全部创建
+    cap = workers * 4
+    task_iter = iter(tasks)
+    loop = asyncio.new_event_loop()
+    probes = set()
+    try:
+        sem = asyncio.Semaphore(workers)
+        results = asyncio.Queue()
+        pending = 0
+        while True:
+            for host, port in itertools.islice(task_iter, cap - pending):
+                probe = loop.create_task(_probe(host, port, timeout, sem, results))
+                probes.add(probe)
+                probe.add_done_callback(probes.discard)
+                pending += 1
+            if not pending:
+                break
+            for item in loop.run_until_complete(_next_results(results)):
+                pending -= 1
+                yield item
+    finally:
+        leftover = list(probes)
+        for probe in leftover:
+            probe.cancel()
+        if leftover:
+            loop.run_until_complete(asyncio.gather(*leftover, return_exceptions=True))
+        loop.close()
+
+def scan_targets_threaded(tasks: Iterable[Tuple[str, int]], timeout: float,
+                          workers: int) -> Iterator[Tuple[str, int, bool]]:
+    """
+    线程池扫描（每个端口一次阻塞 connect），逐个产出 (host, port, 是否开放)
+    滑动窗口提交：在途 future 最多为线程数的 4 倍，内存占用与任务总数无关，Ctrl-C 时也能很快退出
+    """
+    cap = workers * 4
+    task_iter = iter(tasks)
+    pending = {}  # future -> (host, port)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while True:
+                for host, port in itertools.islice(task_iter, cap - len(pending)):
+                    pending[executor.submit(check_tcp_port, host, port, timeout)] = (host, port)
+                if not pending:
+                    break
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for fut in done:
+                    host, port = pending.pop(fut)
+                    try:
+                        yield host, port, fut.result()
+                    except Exception:
+                        # 忽略单个任务错误
+                        yield host, port, False
+        finally:
+            for fut in pending:
+                fut.cancel()
+
+def scan_targets_native(tasks: Iterable[Tuple[str, int]], timeout: float,
+                        workers: int = 1024) -> Iterator[Tuple[str, int, bool]]:
+    """
+    C 扩展扫描：任务按块交给 _scan.probe_batch（整块非阻塞 connect + poll，期间释放 GIL），
+    多个线程并行处理不同的块，同时在途的连接数约为 workers
+    不支持 --bind-range（scan_targets 在设置了源端口范围时不会选用此后端）
+    """
+    workers = _max_inflight(workers)
+    chunk = min(_NATIVE_CHUNK, workers)
+    threads = max(1, workers // chunk)
+    timeout_ms = max(1, int(timeout * 1000))
+    task_iter = iter(tasks)
+    pending = {}  # future -> 本块任务列表
+
+    def run(batch: List[Tuple[str, int]]) -> bytearray:
+        ips = array("I", [struct.unpack("=I", socket.inet_aton(h))[0] for h, _ in batch])
+        ports = array("H", [p for _, p in batch])
+        out = bytearray(len(batch))
+        _scan.probe_batch(ips, ports, out, timeout_ms)
+        return out
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        try:
+            while True:
+                while len(pending) < threads * 2:
+                    batch = list(itertools.islice(task_iter, chunk))
+                    if not batch:
+                        break
+                    pending[executor.submit(run, batch)] = batch
+                if not pending:
+                    break
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for fut in done:
+                    batch = pending.pop(fut)
+                    try:
+                        out = fut.result()
+                    except Exception:
+                        # 整块出错时视为全部未开放
+                        out = bytes(len(batch))
+                    for (host, port), is_open in zip(batch, out):
+                        yield host, port, is_open == 1
+        finally:
+            for fut in pending:
+                fut.cancel()
+
+def _resolve_targets(hosts: Iterable[str], names: Dict[str, str], dedupe: bool = True) -> Iterator[str]:
+    """
+    逐个把主机解析为 IP，解析失败的跳过；主机名与 IP 不同时记录到 names（IP -> 主机名）
+    dedupe 为 True 时同一 IP 只扫描一次（HostRange 本身不会重复，可关闭以省内存）
+    """
+    seen = set()
     for h in hosts:
-        for p in ports:
-            tasks.append((h, p))
+        ip = resolve_host(h)
+        if ip is None:
+            print(f"[-] 无法解析主机 {h}，已跳过", file=sys.stderr)
+            continue
+        if dedupe:
+            if ip in seen:
+                continue
+            seen.add(ip)
+        if ip != h:
+            names.setdefault(ip, h)
+        yield ip
 
-    total = len(tasks)
-    if total == 0:
+def scan_targets(hosts: Iterable[str], ports: List[int], timeout: float, workers: Optional[int] = None,
+                 ping_first: bool = False, backend: str = "auto",
+                 on_open: Optional[Callable[[str, int], None]] = None) -> List[Tuple[str, int]]:
+    """
+    并发扫描
+    backend: "io_uring"、"native"（C 扩展）、"epoll"（非阻塞 connect + selectors 多路复用）、"asyncio"、
+    "threads"（线程池），或 "auto"（依次选择可用的 io_uring、native，否则 epoll）
+    on_open: 每发现一个开放端口即调用 on_open(host, port)，此时结果不在内存中累积
+    返回开放的 (host, port) 列表（指定 on_open 时为空列表）
+    """
+    open_list = []
+    if workers is None:
+        workers = 200 if backend == "threads" else 1024
+
+    # 每个主机只解析一次，后续所有端口直接使用 IP；HostRange 按需生成，不预先展开成列表
+    names = {}  # IP -> 用户给出的主机名（仅主机名与 IP 不同时记录）
+    if isinstance(hosts, HostRange):
+        targets = _resolve_targets(hosts, names, dedupe=False)
+        host_count = len(hosts)
+    elif hasattr(hosts, "__len__"):
+        # 主机列表本来就在内存中：解析、去重后再计数（如 localhost 与 127.0.0.1 只算一台）
+        targets = list(_resolve_targets(hosts, names))
+        host_count = len(targets)
+    else:
+        targets = _resolve_targets(hosts, names)
+        host_count = None
+
+    # 如果启用 ping_first，先筛选存活主机（需要完整的主机列表）
+    if ping_first:
+        print("正在 ping 主机以筛选存活目标...")
+        targets = bulk_ping(list(targets), max(1.0, timeout), min(200, workers))
+        host_count = len(targets)
+        print(f"存活主机数: {host_count}")
+
+    # 先取出第一个主机，确认有扫描目标
+    targets = iter(targets)
+    first = next(targets, None)
+    if first is None or not ports:
         return []
+    targets = itertools.chain([first], targets)
 
-    print(f"将并发检测 {len(hosts)} 台主机上的 {len(ports)} 个端口，共 {total} 个任务，workers={workers}")
+    # 按需生成 (host,port) 任务
+    tasks = ((h, p) for h in targets for p in ports)
+    total = host_count * len(ports) if host_count is not None else None
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-        future_to_task = {
-            executor.submit(check_tcp_port, host, port, timeout): (host, port) for host, port in tasks
-        }
-        completed = 0
-        for fut in concurrent.futures.as_completed(future_to_task):
-            host, port = future_to_task[fut]
+    ring = None
+    if backend in ("auto", "io_uring"):
+        try:
+            ring = open_uring()
+            backend = "io_uring"
+        except OSError:
+            if backend == "io_uring":
+                raise
+            # native 后端不支持绑定源端口，指定了 --bind-range 时不自动选择
+            backend = "native" if _scan is not None and _src_port is None else "epoll"
+    if backend == "native":
+        if _scan is None:
+            raise ValueError("native 后端需要先编译 C 扩展：cythonize -i scripts/_scan.pyx")
+        if _src_port is not None:
+            raise ValueError("native 后端不支持 --bind-range")
+
+    print(f"将并发检测 {host_count if host_count is not None else '若干'} 台主机上的 {len(ports)} 个端口，"
+          f"共 {total if total is not None else '若干'} 个任务，backend={backend}，workers={workers}")
+
+    if backend == "io_uring":
+        results = scan_targets_uring(ring, tasks, timeout, workers)
+    elif backend == "native":
+        results = scan_targets_native(tasks, timeout, workers)
+    elif backend == "asyncio":
+        results = scan_targets_asyncio(tasks, timeout, workers)
+    elif backend == "threads":
+        results = scan_targets_threaded(tasks, timeout, workers)
+    elif backend == "epoll":
+        results = scan_targets_epoll(tasks, timeout, workers)
+    else:
+        raise ValueError("不支持的扫描后端: " + backend)
+
+    # 扫描中会大量创建短命的 socket/future 对象，自动 GC 频繁触发会卡住提交循环：
+    # 先把已有对象冻结（不再参与回收），扫描期间关闭自动 GC，只定期手动回收年轻代
+    gc_was_enabled = gc.isenabled()
+    gc.freeze()
+    gc.disable()
+    completed = 0
+    try:
+        for ip, port, is_open in results:
             completed += 1
-            try:
-                if fut.result():
-                    print(f"[+] {host}:{port} 开放")
+            if is_open:
+                host = names.get(ip, ip)
+                print(f"[+] {host}:{port} 开放")
+                if on_open is not None:
+                    on_open(host, port)
+                else:
                     open_list.append((host, port))
-            except Exception as e:
-                # 忽略单个任务错误
-                pass
             # 简单进度显示
-            if completed % 100 == 0 or completed == total:
-                print(f"进度: {completed}/{total}")
+            if completed % 100 == 0:
+                print(f"进度: {completed}/{total if total is not None else '?'}")
+            if completed % _GC_INTERVAL == 0:
+                gc.collect(1)
+    finally:
+        results.close()
+        gc.unfreeze()
+        if gc_was_enabled:
+            gc.enable()
+        gc.collect()
+    print(f"扫描完成，共 {completed} 个任务")
     return open_list
 
+class ResultWriter:
+    """
+    边扫描边把开放端口写入文件，支持 csv / json / jsonl
+    json 以数组形式逐条写入，扫描中断时文件不完整；需要中途可读请用 jsonl（每行一条记录）
+    """
+
+    def __init__(self, out_path: str, fmt: str = "csv", flush_every: int = 100):
+        if fmt not in ("csv", "json", "jsonl"):
+            raise ValueError("不支持的输出格式: " + fmt)
+        self.fmt = fmt
+        self.flush_every = flush_every
+        self.count = 0
+        self._f = open(out_path, "w", newline="" if fmt == "csv" else None, encoding="utf-8")
+        if fmt == "csv":
+            self._csv = csv.writer(self._f)
+            self._csv.writerow(["host", "port"])
+        elif fmt == "json":
+            self._f.write("[")
+
+    def write(self, host: str, port: int):
+        """写入一条开放记录"""
+        if self.fmt == "csv":
+            self._csv.writerow([host, port])
+        else:
+            record = json.dumps({"host": host, "port": port}, ensure_ascii=False)
+            if self.fmt == "json":
+                self._f.write(("\n  " if self.count == 0 else ",\n  ") + record)
+            else:
+                self._f.write(record + "\n")
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self._f.flush()
+
+    def close(self):
+        """补全文件结尾并关闭"""
+        if self._f.closed:
+            return
+        if self.fmt == "json":
+            self._f.write("\n]\n" if self.count else "]\n")
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def output_format(out_path: str) -> Optional[str]:
+    """根据扩展名判断输出格式，不支持时返回 None"""
+    ext = os.path.splitext(out_path)[1].lower().lstrip(".")
+    return ext if ext in ("csv", "json", "jsonl") else None
+
 def save_results(open_list: List[Tuple[str, int]], out_path: str, fmt: str = "csv"):
-    """保存结果到 CSV 或 JSON"""
-    if fmt == "csv":
-        with open(out_path, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(["host", "port"])
-            for host, port in open_list:
-                writer.writerow([host, port])
-    elif fmt == "json":
-        data = [{"host": h, "port": p} for h, p in open_list]
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    else:
-        raise ValueError("不支持的输出格式: " + fmt)
+    """保存结果到 CSV / JSON / JSON Lines"""
+    with ResultWriter(out_path, fmt) as writer:
+        for host, port in open_list:
+            writer.write(host, port)
 
 def main():
     """运行主函数"""
@@ -174,9 +859,19 @@ def main():
     parser.add_argument("--ports", "-p", required=True,
                         help="要扫描的端口：单端口/逗号分隔/范围，例如 22 或 22,80,8000-8010")
     parser.add_argument("--timeout", type=float, default=0.5, help="端口连接超时（秒），默认 0.5")
-    parser.add_argument("--workers", type=int, default=200, help="并发线程数（默认 200）")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="并发数：threads 后端为线程数（默认 200），其余后端为同时在途连接数（默认 1024）")
+    parser.add_argument("--backend", choices=["auto", "io_uring", "native", "epoll", "asyncio", "threads"],
+                        default="auto",
+                        help="扫描后端：io_uring（Linux + liburing）、native（C 扩展 _scan）、"
+                             "epoll（非阻塞 connect + selectors）、asyncio（事件循环）、threads（线程池）；"
+                             "默认 auto，依次选择可用的 io_uring、native，否则 epoll")
+    parser.add_argument("--bind-range", nargs="?", const="20000-60000", metavar="LO-HI",
+                        help="探测时轮转绑定的源端口范围（不带值时为 20000-60000），避免临时端口耗尽")
     parser.add_argument("--ping-first", action="store_true", help="先 ping 主机，跳过不可达的主机（可选）")
-    parser.add_argument("--output", "-o", help="输出文件路径（可选），根据扩展名选择 csv/json，例如 out.csv 或 out.json")
+    parser.add_argument("--output", "-o",
+                        help="输出文件路径（可选），根据扩展名选择 csv/json/jsonl，例如 out.csv 或 out.jsonl；"
+                             "扫描过程中边发现边写入")
     parser.add_argument("--no-print", action="store_true", help="不在控制台打印每个开放端口，只保存到文件（若指定了 --output）")
     args = parser.parse_args()
 
@@ -213,22 +908,39 @@ def main():
         print("没有有效端口，退出。", file=sys.stderr)
         sys.exit(1)
 
-    open_list = scan_targets(hosts, ports, timeout=args.timeout, workers=args.workers, ping_first=args.ping_first)
+    if args.bind_range:
+        if args.backend == "native":
+            parser.error("--backend native 不支持 --bind-range")
+        try:
+            lo, hi = sorted(int(v) for v in args.bind_range.split("-", 1))
+            set_bind_range(lo, hi)
+        except ValueError as e:
+            parser.error(f"--bind-range 格式错误: {e}")
+        # 1024 以下为特权端口，非 root 绑定会失败（EACCES），所有端口都会被报告为未开放
+        if lo < 1024 and hasattr(os, "geteuid") and os.geteuid() != 0:
+            parser.error("--bind-range 包含 1024 以下的特权端口，需要 root 权限")
 
-    # 输出
+    # 指定了输出文件时，先打开文件，扫描中每发现一个开放端口就写入
     if args.output:
-        fmt = "csv" if args.output.lower().endswith(".csv") else "json" if args.output.lower().endswith(".json") else None
+        fmt = output_format(args.output)
         if not fmt:
-            print("输出文件请使用 .csv 或 .json 扩展名。", file=sys.stderr)
+            print("输出文件请使用 .csv、.json 或 .jsonl 扩展名。", file=sys.stderr)
             sys.exit(1)
         try:
-            save_results(open_list, args.output, fmt)
-            print(f"结果已保存到 {args.output}，共 {len(open_list)} 条开放记录。")
+            writer = ResultWriter(args.output, fmt)
         except Exception as e:
-            print("保存结果失败:", e, file=sys.stderr)
+            print("打开输出文件失败:", e, file=sys.stderr)
             sys.exit(1)
+        with writer:
+            scan_targets(hosts, ports, timeout=args.timeout, workers=args.workers,
+                         ping_first=args.ping_first, backend=args.backend, on_open=writer.write)
+        print(f"结果已保存到 {args.output}，共 {writer.count} 条开放记录。")
+        return
+
+    open_list = scan_targets(hosts, ports, timeout=args.timeout, workers=args.workers,
+                             ping_first=args.ping_first, backend=args.backend)
 
-    if not args.no_print and not args.output:
+    if not args.no_print:
         # 控制台打印
         if open_list:
             print("\n扫描结果（开放端口）:")
@@ -2,81 +2,262 @@
 解析图片获取其中的日期，重命名图片文件为日期
 
 pip install easyocr
+默认在有 CUDA 时使用 GPU 推理，设置环境变量 OCR_GPU=0 可强制使用 CPU
+日期位置固定时（如相机水印在右下角），可用 --roi 只识别该区域，大幅减少计算量
+检测阶段默认把图片长边缩放到 1024 像素（--canvas-size / --mag-ratio），GPU 上可加 --fp16 半精度推理
 """
 import os
 import re
 import argparse
-import easyocr
-from PIL import Image
+from typing import Iterator, List, Optional, Tuple
+import cv2
 import numpy as np
 
-# 初始化 OCR
-reader = easyocr.Reader(['ch_sim', 'en'], gpu=False)
+# OCR 模型，首次使用时才加载（见 _get_reader）
+_reader = None
 
-# 命令行参数（必填）
-parser = argparse.ArgumentParser(description="批量 OCR 重命名图片")
-parser.add_argument("src", help="源目录，存放待处理图片")
-parser.add_argument("dst", help="目标目录，保存重命名后的图片")
-args = parser.parse_args()
+# OCR 文本中的日期：年 月 [日 [时:分]]，各部分之间允许有空白
+_DATE_RE = re.compile(r'(\d{2,4})\s*年\s*(\d{1,2})\s*月(?:\s*(\d{1,2})\s*日(?:\s*(\d{1,2})\s*[:：时]\s*(\d{1,2}))?)?')
+# 文件名中不允许的字符（Windows 非法字符和空白）
+_BAD_RE = re.compile(r'[\\/:*?"<>|\s]')
+# 年、月、日、时、分的位数
+_DATE_WIDTHS = (4, 2, 2, 2, 2)
 
-src_folder = args.src
-dst_folder = args.dst
+# --roi 支持的角落
+_ROI_CORNERS = ("top-left", "top-right", "bottom-left", "bottom-right")
 
-# 确保目标目录存在
-os.makedirs(dst_folder, exist_ok=True)
+# --reduce 缩小倍数 -> 解码 flag（解码时直接输出灰度图，并在解码阶段缩小）
+_DECODE_FLAGS = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
 
-for file in os.listdir(src_folder):
-    if not file.lower().endswith((".png", ".jpg", ".jpeg")):
-        continue
+def _get_reader():
+    """加载 OCR 模型（只加载一次，之后复用）"""
+    global _reader
+    if _reader is None:
+        # 延迟导入：被其他脚本 import 时不会加载 torch
+        import torch
+        import easyocr
 
-    src_path = os.path.join(src_folder, file)
+        use_gpu = bool(int(os.environ.get("OCR_GPU", "1"))) and torch.cuda.is_available()
+        if not use_gpu:
+            torch.set_num_threads(os.cpu_count() or 1)
+        _reader = easyocr.Reader(['ch_sim', 'en'], gpu=use_gpu)
+    return _reader
 
-    try:
-        # 用 PIL 打开图片
-        img = Image.open(src_path)
-        img_np = np.array(img)
-
-        # OCR
-        result = reader.readtext(img_np)
-        texts = [text for (_, text, _) in result]
-
-        # 默认使用原文件名
-        ans = os.path.splitext(file)[0]
-
-        # 找到含“年”和“日”或“月”的文本
-        for item in texts:
-            if '年' in item and ('日' in item or '月' in item):
-                ans = item.strip()
-                break
-
-        # 去掉空格 & 替换 Windows 非法字符
-        ans = ans.replace(" ", "")
-        ans = re.sub(r'[\\/:*?"<>|]', '_', ans)
-
-        # 提取数字并格式化
-        nums = re.findall(r'\d+', ans)
-        widths = [4, 2, 2, 2, 2]
-        formatted = [num[:widths[i]].zfill(widths[i]) for i, num in enumerate(nums)]
-        ans = "_".join(formatted)
-
-        # 构造目标路径
-        ext = os.path.splitext(file)[1]
-        dst_path = os.path.join(dst_folder, ans + ext)
-
-        # 避免重名
-        counter = 1
-        while os.path.exists(dst_path):
-            dst_path = os.path.join(dst_folder, f"{ans}_{counter}{ext}")
+def _to_float32(out):
+    """把模型输出（张量或张量的 tuple/list）中的半精度张量转回 FP32"""
+    if isinstance(out, (tuple, list)):
+        return type(out)(_to_float32(o) for o in out)
+    if hasattr(out, "is_floating_point") and out.is_floating_point():
+        return out.float()
+    return out
+
+def enable_fp16(reader) -> bool:
+    """
+    让检测（CRAFT）和识别模型的前向计算在 autocast 下以 FP16 进行，输出再转回 FP32，
+    之后的后处理（如 cv2.threshold）不支持半精度
+    仅在模型位于 CUDA 上时启用（CPU 上部分算子不支持半精度），返回是否已启用
+    """
+    if reader.device != "cuda":
+        return False
+    import torch
+
+    for model in (reader.detector, reader.recognizer):
+        forward = model.forward
+
+        def fp16_forward(*args, _forward=forward, **kwargs):
+            with torch.autocast("cuda", dtype=torch.float16):
+                out = _forward(*args, **kwargs)
+            return _to_float32(out)
+
+        model.forward = fp16_forward
+    return True
+
+def parse_roi(spec: str) -> Tuple:
+    """
+    解析 --roi 参数，支持两种写法：
+    - 'x,y,w,h'：像素坐标，返回 ("px", x, y, w, h)
+    - 'bottom-right:0.3,0.1'：角落 + 宽高占整图的比例，返回 (角落, 宽比例, 高比例)
+    """
+    if ":" in spec:
+        corner, ratios = spec.split(":", 1)
+        corner = corner.strip().lower()
+        if corner not in _ROI_CORNERS:
+            raise ValueError(f"角落只能是 {', '.join(_ROI_CORNERS)}: {corner}")
+        fw, fh = (float(v) for v in ratios.split(","))
+        if not (0 < fw <= 1 and 0 < fh <= 1):
+            raise ValueError(f"宽高比例需在 (0, 1] 之间: {ratios}")
+        return corner, fw, fh
+    x, y, w, h = (int(v) for v in spec.split(","))
+    if x < 0 or y < 0 or w <= 0 or h <= 0:
+        raise ValueError(f"区域坐标无效: {spec}")
+    return "px", x, y, w, h
+
+def crop_roi(img_np: np.ndarray, roi: Tuple) -> np.ndarray:
+    """按 parse_roi 的结果裁剪图片（返回视图，不复制像素）"""
+    height, width = img_np.shape[:2]
+    if roi[0] == "px":
+        _, x, y, w, h = roi
+    else:
+        corner, fw, fh = roi
+        w = max(1, round(width * fw))
+        h = max(1, round(height * fh))
+        x = width - w if corner.endswith("right") else 0
+        y = height - h if corner.startswith("bottom") else 0
+    return img_np[y:y + h, x:x + w]
+
+def scale_roi(roi: Tuple, reduce: int) -> Tuple:
+    """图片在解码时缩小 reduce 倍后，同步缩小像素坐标形式的 roi"""
+    if roi[0] != "px" or reduce == 1:
+        return roi
+    _, x, y, w, h = roi
+    return "px", x // reduce, y // reduce, max(1, w // reduce), max(1, h // reduce)
+
+def load_image(src_path: str, reduce: int = 1) -> np.ndarray:
+    """
+    读取图片为灰度 numpy 数组，一次解码完成，不经过 PIL 再复制
+    灰度只减少解码与裁剪、分组时的内存拷贝：easyocr 检测前会把单通道图转回 3 通道，模型计算量不变
+    np.fromfile + imdecode 可以处理中文路径
+    """
+    img_np = cv2.imdecode(np.fromfile(src_path, dtype=np.uint8), _DECODE_FLAGS[reduce])
+    if img_np is None:
+        raise ValueError(f"无法解码图片: {src_path}")
+    return img_np
+
+def get_non_conflicting_path(dst: str) -> str:
+    """
+    如果目标文件已存在，则自动在文件名后加序号，避免覆盖
+    用 O_CREAT | O_EXCL 原子地创建一个空的占位文件，不会与同时写入目标目录的其他程序冲突
+    """
+    base, ext = os.path.splitext(dst)
+    counter = 1
+    new_dst = dst
+    while True:
+        try:
+            fd = os.open(new_dst, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            new_dst = f"{base}_{counter}{ext}"
             counter += 1
+            continue
+        os.close(fd)
+        return new_dst
+
+def rename_by_texts(src_path: str, texts: List[str], dst_folder: str):
+    """根据 OCR 识别出的文本中的日期重命名（移动）图片"""
+    file = os.path.basename(src_path)
+
+    # 在所有识别文本中查找日期，按 年_月_日_时_分 格式化；找不到时保留原文件名
+    m = _DATE_RE.search(" ".join(texts))
+    if m:
+        ans = "_".join(g[:w].zfill(w) for g, w in zip(m.groups(), _DATE_WIDTHS) if g)
+    else:
+        ans = _BAD_RE.sub("_", os.path.splitext(file)[0])
+
+    # 构造目标路径（避免重名，并占用该文件名）
+    ext = os.path.splitext(file)[1]
+    dst_path = get_non_conflicting_path(os.path.join(dst_folder, ans + ext))
+
+    # 只在成功完成 OCR + 文件名处理后才移动文件，覆盖占位文件
+    try:
+        os.replace(src_path, dst_path)
+        print(f"{file} -> {os.path.basename(dst_path)}")
+    except Exception as e:
+        try:
+            os.remove(dst_path)
+        except OSError:
+            pass
+        print(f"重命名失败，保留原文件 {file}: {e}")
 
-        # 只在成功完成 OCR + 文件名处理后才移动文件
+def ocr_batch(reader, paths: List[str], batch_size: int, roi: Optional[Tuple] = None,
+              reduce: int = 1, canvas_size: int = 1024,
+              mag_ratio: float = 0.7) -> Iterator[Tuple[str, List[str]]]:
+    """
+    批量 OCR 一组图片，逐张产出 (图片路径, 识别出的文本列表)
+    图片以灰度解码（可缩小 reduce 倍），识别前先裁剪到 roi（若指定）
+    检测阶段图片按 mag_ratio 缩放、长边不超过 canvas_size
+    批量推理要求图片尺寸相同，按尺寸分组后分别调用 readtext_batched
+    """
+    groups = {}
+    for src_path in paths:
+        file = os.path.basename(src_path)
         try:
-            os.rename(src_path, dst_path)
-            print(f"{file} -> {os.path.basename(dst_path)}")
+            img_np = load_image(src_path, reduce)
+            if roi is not None:
+                img_np = crop_roi(img_np, roi)
         except Exception as e:
-            print(f"重命名失败，保留原文件 {file}: {e}")
+            print(f"无法解析图片 {file}: {e}")
+            continue
+        groups.setdefault(img_np.shape, []).append((src_path, img_np))
 
-    except Exception as e:
-        print(f"无法解析图片 {file}: {e}")
-        # 出现异常时不删除原文件，继续处理下一张
-        continue
+    for items in groups.values():
+        try:
+            results = reader.readtext_batched([img_np for _, img_np in items], batch_size=batch_size,
+                                              canvas_size=canvas_size, mag_ratio=mag_ratio)
+        except Exception as e:
+            for src_path, _ in items:
+                print(f"无法解析图片 {os.path.basename(src_path)}: {e}")
+            continue
+        for (src_path, _), result in zip(items, results):
+            yield src_path, [text for (_, text, _) in result]
+
+def main():
+    """运行主函数"""
+    # 命令行参数（必填）
+    parser = argparse.ArgumentParser(description="批量 OCR 重命名图片")
+    parser.add_argument("src", help="源目录，存放待处理图片")
+    parser.add_argument("dst", help="目标目录，保存重命名后的图片")
+    parser.add_argument("--batch-size", type=int, default=16,
+                        help="每批送入 OCR 模型的图片数（默认 16），显存/内存不足时调小")
+    parser.add_argument("--roi",
+                        help="只识别图片的部分区域：'x,y,w,h'（像素），"
+                             "或 '角落:宽比例,高比例'，如 bottom-right:0.3,0.1（右下角 30%%宽 x 10%%高）")
+    parser.add_argument("--reduce", type=int, choices=sorted(_DECODE_FLAGS), default=1,
+                        help="解码时把图片缩小为 1/N（大图可用 2/4/8 加快解码与识别，默认 1 不缩小）")
+    parser.add_argument("--canvas-size", type=int, default=1024,
+                        help="文字检测时图片长边的最大像素（默认 1024，日期水印足够清晰；越小越快）")
+    parser.add_argument("--mag-ratio", type=float, default=0.7,
+                        help="文字检测前的图片缩放比例（默认 0.7）")
+    parser.add_argument("--fp16", action="store_true",
+                        help="GPU 上以 FP16 半精度推理（CPU 上忽略）")
+    args = parser.parse_args()
+
+    roi = None
+    if args.roi:
+        try:
+            roi = scale_roi(parse_roi(args.roi), args.reduce)
+        except ValueError as e:
+            parser.error(f"--roi 格式错误: {e}")
+
+    src_folder = args.src
+    dst_folder = args.dst
+    batch_size = max(1, args.batch_size)
+
+    # 确保目标目录存在
+    os.makedirs(dst_folder, exist_ok=True)
+
+    # 初始化 OCR
+    reader = _get_reader()
+    if args.fp16 and not enable_fp16(reader):
+        print("未使用 GPU，忽略 --fp16")
+
+    # scandir 的 DirEntry 自带文件类型，无需额外 stat
+    with os.scandir(src_folder) as entries:
+        paths = [entry.path for entry in entries
+                 if entry.is_file() and entry.name.lower().endswith((".png", ".jpg", ".jpeg"))]
+
+    # 分块读取图片，避免一次把整个目录的图片都载入内存
+    for i in range(0, len(paths), batch_size):
+        for src_path, texts in ocr_batch(reader, paths[i:i + batch_size], batch_size, roi, args.reduce,
+                                         args.canvas_size, args.mag_ratio):
+            try:
+                rename_by_texts(src_path, texts, dst_folder)
+            except Exception as e:
+                # 出现异常时不删除原文件，继续处理下一张
+                print(f"无法解析图片 {os.path.basename(src_path)}: {e}")
+
+if __name__ == "__main__":
+    main()
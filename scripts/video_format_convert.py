@@ -2,28 +2,162 @@
 转换视频格式
 
 ffmpeg
+支持硬件编码：NVIDIA（h264_nvenc）、Intel（h264_qsv）、Apple（h264_videotoolbox），不可用时回退 libx264
+源文件的音视频（及字幕）编码已被目标容器支持时直接封装（-c copy），不重新编码；封装失败时自动改为重新编码
 """
 import os
+import sys
+import json
 import subprocess
 import argparse
+import functools
+import concurrent.futures
+from itertools import repeat
+from typing import Optional
+
+# --hwaccel 取值 -> (编码器, 输入端硬件解码参数, 编码器参数)
+# 编码器参数设定恒定质量，画质与 libx264 默认的 CRF 23 相当（不设置时硬件编码器按较低的默认码率输出）
+HW_ENCODERS = {
+    "nvenc": ("h264_nvenc", ["-hwaccel", "cuda"], ["-preset", "p4", "-rc", "vbr", "-cq", "23", "-b:v", "0"]),
+    "qsv": ("h264_qsv", ["-hwaccel", "qsv"], ["-global_quality", "23"]),
+    "videotoolbox": ("h264_videotoolbox", ["-hwaccel", "videotoolbox"], ["-q:v", "65"]),
+}
+
+# 转换时的 ffmpeg 公共参数：-nostdin 不读取终端（多个 ffmpeg 并行时不会争抢按键、把终端留在 raw 模式），
+# 只输出错误和一行进度，并行时输出不会混成一团
+FFMPEG = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-stats"]
+
+# 容器 -> (可直接封装的视频编码, 可直接封装的音频编码, 可直接封装的字幕编码)
+COPY_COMPATIBLE = {
+    "mp4": ({"h264", "hevc"}, {"aac", "mp3", "alac"}, {"mov_text"}),
+    "m4v": ({"h264", "hevc"}, {"aac", "mp3", "alac"}, {"mov_text"}),
+    "mov": ({"h264", "hevc", "prores"}, {"aac", "mp3", "alac", "pcm_s16le"}, {"mov_text"}),
+    "mkv": ({"h264", "hevc", "vp8", "vp9", "av1", "mpeg4"}, {"aac", "mp3", "opus", "vorbis", "flac", "ac3", "eac3"},
+            {"subrip", "ass", "ssa", "webvtt", "hdmv_pgs_subtitle", "dvd_subtitle"}),
+    "webm": ({"vp8", "vp9", "av1"}, {"opus", "vorbis"}, {"webvtt"}),
+}
 
 def get_non_conflicting_path(dst: str) -> str:
     """
     如果目标文件已存在，则自动在文件名后加序号，避免覆盖
+    用 O_CREAT | O_EXCL 原子地创建一个空的占位文件，多个进程同时转换也不会选中同一个文件名
     """
     base, ext = os.path.splitext(dst)
     counter = 1
     new_dst = dst
-    while os.path.exists(new_dst):
-        new_dst = f"{base}_{counter}{ext}"
-        counter += 1
-    return new_dst
+    while True:
+        try:
+            fd = os.open(new_dst, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            new_dst = f"{base}_{counter}{ext}"
+            counter += 1
+            continue
+        os.close(fd)
+        return new_dst
+
+@functools.lru_cache(maxsize=None)
+def hw_encoder_available(hwaccel: str) -> bool:
+    """检查硬件编码器是否可用：ffmpeg 编译时包含该编码器，且实际能编码一帧（有对应的硬件）"""
+    encoder = HW_ENCODERS[hwaccel][0]
+    try:
+        listing = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"],
+                                 capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    if encoder not in listing.split():
+        return False
+    test = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", "color=c=black:s=256x256", "-frames:v", "1",
+            "-c:v", encoder, "-f", "null", "-"]
+    return subprocess.run(test, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+
+def resolve_hwaccel(hwaccel: str="auto") -> str:
+    """将 --hwaccel 参数解析为实际使用的硬件编码方式，无可用硬件编码器时返回 "none"（libx264）"""
+    if hwaccel == "none":
+        return "none"
+    if hwaccel == "auto":
+        candidates = ["videotoolbox"] if sys.platform == "darwin" else ["nvenc", "qsv"]
+    else:
+        candidates = [hwaccel]
+    for name in candidates:
+        if hw_encoder_available(name):
+            return name
+    if hwaccel != "auto":
+        print(f"硬件编码器 {HW_ENCODERS[hwaccel][0]} 不可用，改用 libx264")
+    return "none"
 
-def convert_video(src: str, output_ext: str="mp4"):
+def probe_streams(src: str) -> list:
+    """使用 ffprobe 读取源文件的流信息"""
+    result = subprocess.run(["ffprobe", "-v", "error", "-print_format", "json", "-show_streams", src],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout).get("streams", [])
+
+def can_stream_copy(src: str, output_ext: str) -> bool:
+    """源文件所有音视频流、字幕流的编码都被目标容器支持时返回 True（可直接 -c copy 封装）"""
+    if output_ext not in COPY_COMPATIBLE:
+        return False
+    video_codecs, audio_codecs, subtitle_codecs = COPY_COMPATIBLE[output_ext]
+    try:
+        streams = probe_streams(src)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return False
+    has_video = False
+    for stream in streams:
+        codec_type = stream.get("codec_type")
+        codec_name = stream.get("codec_name")
+        if codec_type == "video":
+            # 封面图等附加图片不作为视频流
+            if stream.get("disposition", {}).get("attached_pic"):
+                return False
+            if codec_name not in video_codecs:
+                return False
+            has_video = True
+        elif codec_type == "audio":
+            if codec_name not in audio_codecs:
+                return False
+        elif codec_type == "subtitle":
+            # 如 srt 不能直接封装进 mp4（需转为 mov_text），此时走转码
+            if codec_name not in subtitle_codecs:
+                return False
+        # 数据流（如 mov 的 timecode）在封装命令中用 -dn 丢弃，忽略
+    return has_video
+
+def _copy_command(src: str, dst: str, output_ext: str) -> list:
+    """只换容器的 ffmpeg 命令：显式映射全部音视频、字幕流，丢弃数据流"""
+    command = [*FFMPEG, "-i", src, "-map", "0:v", "-map", "0:a?", "-map", "0:s?", "-dn", "-c", "copy"]
+    if output_ext in ("mp4", "m4v", "mov"):
+        command += ["-movflags", "+faststart"]
+    return command + [dst, "-y"]
+
+def _transcode_command(src: str, dst: str, threads: Optional[int], hwaccel: str) -> list:
+    """重新编码的 ffmpeg 命令"""
+    if hwaccel in HW_ENCODERS:
+        encoder, decode_args, encode_args = HW_ENCODERS[hwaccel]
+    else:
+        encoder, decode_args, encode_args = "libx264", [], []
+
+    command = [
+        *FFMPEG,
+        *decode_args,
+        "-i", src,
+        "-c:v", encoder,    # 视频转码为 H.264（兼容性高）
+        *encode_args,
+        "-c:a", "aac",      # 音频转码为 AAC
+        "-strict", "experimental",
+    ]
+    if threads:
+        command += ["-threads", str(threads)]
+    return command + [dst, "-y"]
+
+def convert_video(src: str, output_ext: str="mp4", threads: Optional[int]=None, hwaccel: str="none",
+                  force_transcode: bool=False):
     """使用 ffmpeg 转换视频格式
     
     :param src: 源文件路径
     :param output_ext: 输出格式扩展名（不带点，如 "mp4"、"mkv"）
+    :param threads: ffmpeg 线程数，多个文件并行转换时用来避免线程数超过 CPU 核数
+    :param hwaccel: 硬件编码方式（"nvenc"、"qsv"、"videotoolbox"，"none" 为 libx264），需先经 resolve_hwaccel 确认可用
+    :param force_transcode: 即使编码兼容也强制重新编码
     """
     if not os.path.isfile(src):
         raise FileNotFoundError(f"文件不存在: {src}")
@@ -31,18 +165,26 @@ def convert_video(src: str, output_ext: str="mp4"):
     dst = os.path.splitext(src)[0] + f".{output_ext}"
     dst = get_non_conflicting_path(dst)
 
-    command = [
-        "ffmpeg",
-        "-i", src,
-        "-c:v", "libx264",  # 视频转码为 H.264（兼容性高）
-        "-c:a", "aac",      # 音频转码为 AAC
-        "-strict", "experimental",
-        dst,
-        "-y"
-    ]
-
-    print(f"正在转换: {src} -> {dst}")
-    subprocess.run(command, check=True)
+    try:
+        copied = False
+        if not force_transcode and can_stream_copy(src, output_ext):
+            # 只换容器，不重新编码
+            print(f"正在封装（不转码）: {src} -> {dst}")
+            try:
+                subprocess.run(_copy_command(src, dst, output_ext), check=True)
+                copied = True
+            except subprocess.CalledProcessError:
+                print(f"直接封装失败，改为重新编码: {src}")
+        if not copied:
+            print(f"正在转换: {src} -> {dst}")
+            subprocess.run(_transcode_command(src, dst, threads, hwaccel), check=True)
+    except BaseException:
+        # 转换失败或被中断时删除占位文件
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        raise
     print("转换完成 ✅")
 
 if __name__ == "__main__":
@@ -50,15 +192,28 @@ if __name__ == "__main__":
     parser.add_argument("src", help="输入文件或目录")
     parser.add_argument("--input-ext", default="mov", help="输入文件扩展名（默认 mov）")
     parser.add_argument("--output-ext", default="mp4", help="输出文件扩展名（默认 mp4）")
+    parser.add_argument("--jobs", "-j", type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                        help="目录模式下同时运行的 ffmpeg 进程数（默认 CPU 核数的一半）")
+    parser.add_argument("--hwaccel", choices=["auto", "nvenc", "qsv", "videotoolbox", "none"], default="auto",
+                        help="视频硬件编码（默认 auto：自动选择可用的硬件编码器，没有则用 libx264）")
+    parser.add_argument("--force-transcode", action="store_true",
+                        help="总是重新编码（默认在编码兼容时直接封装，不转码）")
     args = parser.parse_args()
 
     input_ext = args.input_ext.lower().lstrip(".")
     output_ext = args.output_ext.lower().lstrip(".")
+    hwaccel = resolve_hwaccel(args.hwaccel)
 
     if os.path.isdir(args.src):
-        for file in os.listdir(args.src):
-            if file.lower().endswith(f".{input_ext}"):
-                video_path = os.path.join(args.src, file)
-                convert_video(video_path, output_ext)
+        # scandir 的 DirEntry 自带文件类型，无需额外 stat
+        with os.scandir(args.src) as entries:
+            paths = [entry.path for entry in entries
+                     if entry.is_file() and entry.name.lower().endswith(f".{input_ext}")]
+        jobs = max(1, min(args.jobs, len(paths)))
+        # 多进程并行转换，每个 ffmpeg 分到的线程数 = CPU 核数 / 进程数
+        threads = max(1, (os.cpu_count() or 1) // jobs) if jobs > 1 else None
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            list(executor.map(convert_video, paths, repeat(output_ext), repeat(threads), repeat(hwaccel),
+                              repeat(args.force_transcode)))
     else:
-        convert_video(args.src, output_ext)
+        convert_video(args.src, output_ext, hwaccel=hwaccel, force_transcode=args.force_transcode)